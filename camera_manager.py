@@ -1,17 +1,121 @@
 from PyQt5.QtCore import QThread, pyqtSignal, QMutex, QWaitCondition
 import cv2
 import numpy as np
+import os
 import time
 from datetime import datetime
-import queue
+from collections import deque
+
+# Bật các nhánh SIMD/IPP của OpenCV
+cv2.setUseOptimized(True)
+
+try:
+    from numba import njit
+except ImportError:  # numba là optional, fallback về connectedComponentsWithStats
+    njit = None
+
+fused_filters = None  # Module filters.pyx, chỉ build khi config bật fused_filters
+fused_filters_failed = False
+
+def load_fused_filters():
+    """Build và import filters.pyx lần đầu cần dùng (cần Cython + C compiler), None nếu lỗi"""
+    global fused_filters, fused_filters_failed
+    if fused_filters is None and not fused_filters_failed:
+        try:
+            import pyximport
+            # Gỡ import hook ngay sau khi build, không ảnh hưởng các import khác
+            importers = pyximport.install(language_level=3)
+            try:
+                import filters
+            finally:
+                pyximport.uninstall(*importers)
+            fused_filters = filters
+        except Exception as e:
+            fused_filters_failed = True
+            print(f"Fused filters unavailable: {str(e)}")
+    return fused_filters
+
+if njit is not None:
+    # Signature cố định: numba compile ngay khi import, không JIT ở frame đầu tiên
+    @njit('int64(int64[::1], int64)', cache=True)
+    def _find_root(parent, i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    @njit('boolean(uint8[:, ::1], int64)', cache=True, fastmath=True)
+    def any_component_larger(mask, min_area):
+        """Kiểm tra có vùng liên thông (8-connectivity) nào lớn hơn min_area.
+
+        Quét từng dòng, mỗi run pixel khác 0 là một node union-find; dừng
+        ngay khi diện tích một vùng vượt ngưỡng.
+        """
+        height, width = mask.shape
+        max_runs = height * ((width + 1) // 2)
+        parent = np.empty(max_runs, np.int64)
+        area = np.empty(max_runs, np.int64)
+        run_start = np.empty(max_runs, np.int64)
+        run_end = np.empty(max_runs, np.int64)
+        
+        n = 0
+        prev_first = 0
+        prev_last = 0
+        for y in range(height):
+            row_first = n
+            p = prev_first
+            x = 0
+            while x < width:
+                if mask[y, x] == 0:
+                    x += 1
+                    continue
+                start = x
+                while x < width and mask[y, x] != 0:
+                    x += 1
+                    
+                parent[n] = n
+                area[n] = x - start
+                run_start[n] = start
+                run_end[n] = x
+                if area[n] > min_area:
+                    return True
+                    
+                # Các run dòng trên kề (kể cả chéo) với [start, x)
+                while p < prev_last and run_end[p] < start:
+                    p += 1
+                q = p
+                while q < prev_last and run_start[q] <= x:
+                    root = _find_root(parent, n)
+                    other = _find_root(parent, q)
+                    if other != root:
+                        parent[other] = root
+                        area[root] += area[other]
+                        if area[root] > min_area:
+                            return True
+                    q += 1
+                n += 1
+            prev_first = row_first
+            prev_last = n
+        return False
+
+def has_motion_region(thresh, min_area):
+    """Kiểm tra mask nhị phân có vùng chuyển động lớn hơn min_area"""
+    if njit is not None:
+        return bool(any_component_larger(thresh, min_area))
+        
+    # Diện tích từng vùng liên thông, bỏ label 0 (background)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    return bool((stats[1:, cv2.CC_STAT_AREA] > min_area).any())
 
 class CameraThread(QThread):
-    frame_ready = pyqtSignal(np.ndarray, str)  # Signal gửi frame và camera_id
+    frame_ready = pyqtSignal(int, str)  # Signal gửi index frame trong frame_ring và camera_id
     error_occurred = pyqtSignal(str, str)  # Signal báo lỗi (camera_id, error_message)
     status_changed = pyqtSignal(str, bool)  # Signal báo trạng thái kết nối (camera_id, connected)
     fps_updated = pyqtSignal(str, float)  # Signal cập nhật FPS (camera_id, fps)
     motion_detected = pyqtSignal(str, bool)  # Signal phát hiện chuyển động (camera_id, detected)
 
+    _SHARPEN_KERNEL = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]], dtype=np.float32)
+
     def __init__(self, camera_id, camera_url, config=None):
         super().__init__()
         self.camera_id = camera_id
@@ -27,56 +131,100 @@ class CameraThread(QThread):
         # Camera settings
         self.fps_limit = self.config.get('fps_limit', 30)
         self.frame_interval = 1.0 / self.fps_limit
+        self.frame_interval_ns = int(self.frame_interval * 1_000_000_000)
         self.resolution = self.config.get('resolution', (1280, 720))
         
         # Performance monitoring
         self.fps_counter = 0
-        self.fps_timer = time.time()
+        self.fps_timer_ns = time.monotonic_ns()
         self.current_fps = 0.0
         
         # Motion detection
         self.motion_detection_enabled = self.config.get('motion_detection', False)
+        self.last_motion = False  # Chỉ emit motion_detected khi trạng thái đổi
         self.motion_threshold = self.config.get('motion_threshold', 25)
         self.min_motion_area = self.config.get('min_motion_area', 500)
+        # MOG2 chạy trên frame grayscale thu nhỏ, ngưỡng diện tích scale theo
+        self.motion_scale = self.config.get('motion_scale', 0.25)
+        self.scaled_min_motion_area = int(self.min_motion_area * self.motion_scale ** 2)
+        self.motion_size = (max(1, int(self.resolution[0] * self.motion_scale)),
+                            max(1, int(self.resolution[1] * self.motion_scale)))
+        self.motion_pool = None  # Gán bởi CameraManager nếu dùng chung MOG2
+        self.motion_slot = None
+        
+        # CPU để pin thread (Linux), gán bởi CameraManager
+        self.cpu_affinity = None
+        self.mog2_history = self.config.get('mog2_history', 500)
+        self.mog2_var_threshold = self.config.get('mog2_var_threshold', 16)
+        self.mog2_detect_shadows = self.config.get('mog2_detect_shadows', True)
         self.background_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=500, varThreshold=16, detectShadows=True)
+            history=self.mog2_history, 
+            varThreshold=self.mog2_var_threshold, 
+            detectShadows=self.mog2_detect_shadows)
+        
+        # Frame filters
+        self.load_filter_config()
+        
+        # GPU acceleration (CUDA hoặc OpenCL qua UMat)
+        self.init_gpu()
+        
+        # Frame buffer: ring các frame cấp phát sẵn, chỉ truyền index qua signal
+        self.ring_size = max(2, self.config.get('ring_size', 30))
+        self.frame_ring = np.empty(
+            (self.ring_size, self.resolution[1], self.resolution[0], 3), dtype=np.uint8)
+        self.ring_index = 0
+        self.work_buffer = np.empty_like(self.frame_ring[0])  # Buffer trung gian cho filters
+        # Index các frame gần nhất, ít hơn ring một slot: slot cap.read() sắp ghi không nằm trong buffer
+        self.frame_buffer = deque(maxlen=self.ring_size - 1)
         
-        # Frame buffer
-        self.frame_buffer = queue.Queue(maxsize=30)  # Buffer 30 frames
+        # Coalesce frame_ready: consumer gọi acknowledge_frame sau mỗi frame
+        self.coalesce_frames = False
+        self.frame_pending = False
+        
+        # Display ring: frame đã thu nhỏ về kích thước view, cùng index với frame_ring
+        self.display_size = self.config.get('display_size')
+        self.display_ring = None
+        if self.display_size:
+            self.display_size = tuple(self.display_size)
+            self.display_ring = np.empty(
+                (self.ring_size, self.display_size[1], self.display_size[0], 3), dtype=np.uint8)
         
         # Error handling
         self.retry_count = 0
+        self.grab_retries = self.config.get('grab_retries', 5)  # Lỗi frame tạm thời
         self.max_retries = 3
         self.retry_interval = 5  # seconds
 
     def run(self):
         self.is_running = True
+        if self.cpu_affinity is not None and hasattr(os, 'sched_setaffinity'):
+            try:
+                # pid 0 = thread hiện tại
+                os.sched_setaffinity(0, {self.cpu_affinity})
+            except OSError as e:
+                self.error_occurred.emit(self.camera_id, f"CPU affinity error: {str(e)}")
+                
+        cap = None
         while self.is_running:
             if self.is_paused:
                 self.wait_condition.wait(self.mutex)
                 continue
                 
             try:
-                cap = cv2.VideoCapture(self.camera_url)
-                if not cap.isOpened():
-                    raise Exception("Could not open camera connection")
-                
-                # Configure camera settings
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+                # Giữ kết nối qua pause/resume, chỉ mở lại sau lỗi
+                if cap is None or not cap.isOpened():
+                    cap = self.open_capture()
+                    self.status_changed.emit(self.camera_id, True)
+                    self.retry_count = 0
                 
-                self.status_changed.emit(self.camera_id, True)
-                self.retry_count = 0
-                
-                last_frame_time = time.time()
+                last_frame_ns = time.monotonic_ns()
                 
                 while self.is_running and not self.is_paused:
-                    # Control frame rate
-                    current_time = time.time()
-                    if current_time - last_frame_time < self.frame_interval:
-                        continue
-                        
-                    ret, frame = cap.read()
+                    index = self.ring_index
+                    slot = self.frame_ring[index]
+                    ret, frame = cap.read(slot)
+                    if not ret:
+                        ret, frame = self.recover_frame(cap, slot)
                     if not ret:
                         raise Exception("Failed to grab frame")
                         
@@ -84,26 +232,47 @@ class CameraThread(QThread):
                     self.update_fps()
                     
                     # Process frame
-                    processed_frame = self.process_frame(frame)
+                    processed_frame = self.process_frame(frame, slot)
+                    if processed_frame is not slot:
+                        if processed_frame.shape == slot.shape:
+                            np.copyto(slot, processed_frame)
+                        else:
+                            cv2.resize(processed_frame, tuple(self.resolution), dst=slot)
                     
                     # Motion detection
                     if self.motion_detection_enabled:
-                        motion_detected = self.detect_motion(processed_frame)
-                        self.motion_detected.emit(self.camera_id, motion_detected)
+                        motion_detected = self.detect_motion(slot)
+                        if motion_detected != self.last_motion:
+                            self.last_motion = motion_detected
+                            self.motion_detected.emit(self.camera_id, motion_detected)
+                    
+                    # Frame hiển thị: resize một lần trên camera thread, view chỉ upload
+                    if self.display_ring is not None:
+                        cv2.resize(slot, self.display_size, dst=self.display_ring[index],
+                            interpolation=cv2.INTER_AREA)
                     
                     # Buffer frame
-                    if not self.frame_buffer.full():
-                        self.frame_buffer.put(processed_frame)
+                    self.frame_buffer.append(index)
+                    self.ring_index = (index + 1) % self.ring_size
                     
-                    # Emit frame
-                    self.frame_ready.emit(processed_frame, self.camera_id)
+                    # Emit frame, bỏ qua nếu UI chưa xử lý xong frame trước
+                    if not self.coalesce_frames:
+                        self.frame_ready.emit(index, self.camera_id)
+                    elif not self.frame_pending:
+                        self.frame_pending = True
+                        self.frame_ready.emit(index, self.camera_id)
                     
-                    last_frame_time = current_time
+                    # Control frame rate: ngủ phần thời gian còn lại thay vì busy-wait
+                    elapsed_ns = time.monotonic_ns() - last_frame_ns
+                    if elapsed_ns < self.frame_interval_ns:
+                        self.msleep((self.frame_interval_ns - elapsed_ns) // 1_000_000)
+                    last_frame_ns = time.monotonic_ns()
                     
             except Exception as e:
                 self.handle_error(str(e))
                 if cap is not None:
                     cap.release()
+                    cap = None
                     
                 if self.retry_count >= self.max_retries:
                     self.error_occurred.emit(self.camera_id, 
@@ -117,64 +286,259 @@ class CameraThread(QThread):
         if cap is not None:
             cap.release()
             
-    def process_frame(self, frame):
-        """Xử lý frame trước khi gửi đi"""
+    def open_capture(self):
+        """Mở kết nối camera ở chế độ low-latency"""
+        url = self.camera_url.lower() if isinstance(self.camera_url, str) else ''
+        if url.startswith(('rtsp://', 'rtsps://', 'http://', 'https://')):
+            if url.startswith(('rtsp://', 'rtsps://')):
+                # Phải set trước khi tạo VideoCapture
+                os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', 
+                    'rtsp_transport;tcp|buffer_size;102400')
+            params = []
+            if hasattr(cv2, 'CAP_PROP_OPEN_TIMEOUT_MSEC'):
+                params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 5000]
+            cap = cv2.VideoCapture(self.camera_url, cv2.CAP_FFMPEG, params)
+        else:
+            # Webcam index, /dev/videoN, file hoặc GStreamer pipeline: để OpenCV tự chọn backend
+            cap = cv2.VideoCapture(self.camera_url)
+            
+        if not cap.isOpened():
+            cap.release()
+            raise Exception("Could not open camera connection")
+            
+        # Configure camera settings
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.resolution[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.resolution[1])
+        return cap
+
+    def recover_frame(self, cap, slot):
+        """Thử grab lại khi read lỗi tạm thời, không tạo lại kết nối"""
+        for _ in range(self.grab_retries):
+            if not self.is_running:
+                break
+            if cap.grab():
+                return cap.retrieve(slot)
+            self.msleep(10)
+        return False, None
+
+    def load_filter_config(self):
+        """Đọc cấu hình filter một lần, tránh tra dict trong vòng lặp frame"""
+        self.denoise = self.config.get('denoise', False)
+        # 'bilateral' (mặc định, realtime), 'gaussian' hoặc 'nlmeans' (chậm, chất lượng cao)
+        self.denoise_mode = self.config.get('denoise_mode', 'bilateral')
+        self.sharpen = self.config.get('sharpen', False)
+        self.brightness = self.config.get('brightness', 0)
+        self.brightness_alpha = 1
+        # Gộp sharpen + brightness vào một kernel Cython (filters.pyx)
+        self.fused_filters = (self.config.get('fused_filters', False) 
+                              and load_fused_filters() is not None)
+        self.has_filters = self.denoise or self.sharpen or self.brightness != 0
+
+    def update_config(self, config):
+        """Cập nhật cấu hình cho camera thread"""
+        self.config.update(config)
+        self.load_filter_config()
+
+    def init_gpu(self):
+        """Kiểm tra và khởi tạo GPU pipeline cho process_frame"""
+        self.use_cuda = False
+        self.use_opencl = False
+        if not self.config.get('gpu_acceleration', True):
+            return
+            
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                self.gpu_frame = cv2.cuda_GpuMat()
+                # CUDA linear filter không hỗ trợ CV_8UC3, filter trên BGRA
+                self.gpu_sharpen = cv2.cuda.createLinearFilter(
+                    cv2.CV_8UC4, cv2.CV_8UC4, self._SHARPEN_KERNEL)
+                self.gpu_gaussian = cv2.cuda.createGaussianFilter(
+                    cv2.CV_8UC4, cv2.CV_8UC4, (3, 3), 0)
+                self.use_cuda = True
+                return
+        except (cv2.error, AttributeError):
+            pass  # OpenCV build không có CUDA
+            
+        if cv2.ocl.haveOpenCL():
+            cv2.ocl.setUseOpenCL(True)
+            self.use_opencl = True
+
+    def process_frame(self, frame, out=None):
+        """Xử lý frame trước khi gửi đi, ghi kết quả vào out nếu có thể"""
+        size = tuple(self.resolution)
+        needs_resize = (frame.shape[1], frame.shape[0]) != size
+        
+        # Không có filter nào: bỏ qua GPU upload/download, frame đã nằm sẵn trong out
+        if not self.has_filters and not needs_resize:
+            if out is not None and frame is not out:
+                np.copyto(out, frame)
+                return out
+            return frame
+            
+        # GPU chỉ đáng dùng khi có filter, resize đơn thuần chạy CPU ghi thẳng vào out
+        if self.has_filters and self.use_cuda:
+            return self.process_frame_cuda(frame, out)
+        if self.has_filters and self.use_opencl:
+            return self.process_frame_opencl(frame)
+            
         try:
+            if out is None:
+                out = np.empty((size[1], size[0], 3), dtype=np.uint8)
+                
             # Resize nếu cần
-            if frame.shape[:2] != self.resolution:
-                frame = cv2.resize(frame, self.resolution)
+            if needs_resize:
+                cv2.resize(frame, size, dst=out)
+            elif frame is not out:
+                np.copyto(out, frame)
+                
+            # Các filter ghi qua lại giữa out và work_buffer, không cấp phát mới
+            src, spare = out, self.work_buffer
             
             # Áp dụng các filter từ config
-            if self.config.get('denoise', False):
-                frame = cv2.fastNlMeansDenoisingColored(frame)
+            if self.denoise:
+                if self.denoise_mode == 'nlmeans':
+                    cv2.fastNlMeansDenoisingColored(src, spare)
+                elif self.denoise_mode == 'gaussian':
+                    cv2.GaussianBlur(src, (3, 3), 0, dst=spare)
+                else:
+                    cv2.bilateralFilter(src, 5, 50, 50, dst=spare)
+                src, spare = spare, src
+                
+            if self.fused_filters and self.sharpen and self.brightness != 0:
+                fused_filters.sharpen_brighten(src, spare, self.brightness)
+                return spare
                 
-            if self.config.get('sharpen', False):
-                kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-                frame = cv2.filter2D(frame, -1, kernel)
+            if self.sharpen:
+                cv2.filter2D(src, -1, self._SHARPEN_KERNEL, dst=spare)
+                src, spare = spare, src
                 
-            if self.config.get('brightness', 0) != 0:
-                frame = cv2.convertScaleAbs(frame, 
-                    alpha=1, beta=self.config['brightness'])
+            if self.brightness != 0:
+                cv2.convertScaleAbs(src, dst=src, 
+                    alpha=self.brightness_alpha, beta=self.brightness)
                 
+            return src
+            
+        except Exception as e:
+            self.error_occurred.emit(self.camera_id, f"Frame processing error: {str(e)}")
             return frame
+
+    def process_frame_opencl(self, frame):
+        """Xử lý frame qua UMat, OpenCV tự chạy các hàm bên dưới bằng OpenCL"""
+        try:
+            src = cv2.UMat(frame)
+            
+            # Resize nếu cần
+            if (frame.shape[1], frame.shape[0]) != tuple(self.resolution):
+                src = cv2.resize(src, tuple(self.resolution))
+            
+            # Áp dụng các filter từ config
+            if self.denoise:
+                if self.denoise_mode == 'nlmeans':
+                    src = cv2.fastNlMeansDenoisingColored(src)
+                elif self.denoise_mode == 'gaussian':
+                    src = cv2.GaussianBlur(src, (3, 3), 0)
+                else:
+                    src = cv2.bilateralFilter(src, 5, 50, 50)
+                
+            if self.sharpen:
+                src = cv2.filter2D(src, -1, self._SHARPEN_KERNEL)
+                
+            if self.brightness != 0:
+                src = cv2.convertScaleAbs(src, 
+                    alpha=self.brightness_alpha, beta=self.brightness)
+                
+            return src.get()
             
         except Exception as e:
             self.error_occurred.emit(self.camera_id, f"Frame processing error: {str(e)}")
             return frame
 
+    def process_frame_cuda(self, frame, out=None):
+        """Xử lý frame trên GPU, chỉ upload/download một lần"""
+        try:
+            self.gpu_frame.upload(frame)
+            gpu = self.gpu_frame
+            
+            if gpu.size() != tuple(self.resolution):
+                gpu = cv2.cuda.resize(gpu, tuple(self.resolution))
+                
+            if self.denoise:
+                if self.denoise_mode == 'nlmeans':
+                    gpu = cv2.cuda.fastNlMeansDenoisingColored(gpu, 3, 3)
+                elif self.denoise_mode == 'gaussian':
+                    gpu = self.apply_bgra_filter(gpu, self.gpu_gaussian)
+                else:
+                    gpu = cv2.cuda.bilateralFilter(gpu, 5, 50, 50)
+                
+            if self.sharpen:
+                gpu = self.apply_bgra_filter(gpu, self.gpu_sharpen)
+                
+            if self.brightness != 0:
+                gpu = cv2.cuda.addWeighted(gpu, self.brightness_alpha, gpu, 0.0, 
+                    self.brightness)
+                
+            return gpu.download(out) if out is not None else gpu.download()
+            
+        except Exception as e:
+            self.error_occurred.emit(self.camera_id, f"Frame processing error: {str(e)}")
+            return frame
+
+    def apply_bgra_filter(self, gpu, cuda_filter):
+        """Áp dụng CUDA filter chỉ hỗ trợ 4 kênh lên frame BGR"""
+        bgra = cv2.cuda.cvtColor(gpu, cv2.COLOR_BGR2BGRA)
+        bgra = cuda_filter.apply(bgra)
+        return cv2.cuda.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+
     def detect_motion(self, frame):
         """Phát hiện chuyển động trong frame"""
         try:
+            # Downscale + grayscale trước background subtraction
+            small = cv2.resize(frame, self.motion_size, interpolation=cv2.INTER_AREA)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+            
+            # Camera dùng chung MOG2 của MotionPool, kết quả trễ một chu kỳ
+            if self.motion_pool is not None:
+                return self.motion_pool.submit(self.motion_slot, gray)
+            
             # Apply background subtraction
-            fgmask = self.background_subtractor.apply(frame)
+            fgmask = self.background_subtractor.apply(gray)
             
             # Threshold to binary image
             _, thresh = cv2.threshold(fgmask, self.motion_threshold, 255, cv2.THRESH_BINARY)
             
-            # Find contours
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Check for significant motion
-            for contour in contours:
-                if cv2.contourArea(contour) > self.min_motion_area:
-                    return True
-                    
-            return False
+            return has_motion_region(thresh, self.scaled_min_motion_area)
             
         except Exception as e:
             self.error_occurred.emit(self.camera_id, f"Motion detection error: {str(e)}")
             return False
 
+    def acknowledge_frame(self, camera_id=None):
+        """Consumer báo đã xử lý frame, cho phép emit frame_ready tiếp theo"""
+        self.frame_pending = False
+
+    def pop_buffered_frame(self):
+        """Lấy frame cũ nhất trong buffer, None nếu buffer rỗng.
+
+        Trả về view vào frame_ring (không copy), chỉ hợp lệ tới khi ring quay lại slot đó.
+        """
+        try:
+            index = self.frame_buffer.popleft()
+        except IndexError:
+            return None
+        return self.frame_ring[index]
+
     def update_fps(self):
         """Cập nhật FPS counter"""
         self.fps_counter += 1
-        current_time = time.time()
+        now_ns = time.monotonic_ns()
+        elapsed_ns = now_ns - self.fps_timer_ns
         
-        if current_time - self.fps_timer >= 1.0:
-            self.current_fps = self.fps_counter / (current_time - self.fps_timer)
+        if elapsed_ns >= 1_000_000_000:
+            self.current_fps = self.fps_counter * 1_000_000_000 / elapsed_ns
             self.fps_updated.emit(self.camera_id, self.current_fps)
             self.fps_counter = 0
-            self.fps_timer = current_time
+            self.fps_timer_ns = now_ns
 
     def handle_error(self, error_message):
         """Xử lý lỗi camera"""
@@ -200,10 +564,125 @@ class CameraThread(QThread):
         self.resume()  # Wake up thread if it's paused
         self.wait()
 
+class MotionPool(QThread):
+    """Một MOG2 dùng chung cho các camera có cùng kích thước frame motion và tham số MOG2.
+
+    Mỗi camera ghi frame grayscale đã thu nhỏ vào một slot của mosaic; worker
+    chạy apply() một lần cho cả mosaic mỗi chu kỳ rồi tách mask theo slot.
+    Mosaic chỉ rộng tới slot cao nhất đang dùng, không chạy MOG2 trên slot trống.
+    """
+
+    def __init__(self, frame_size, capacity=8, config=None):
+        super().__init__()
+        self.config = config or {}
+        self.frame_size = frame_size  # (width, height) của frame motion
+        self.capacity = capacity
+        self.frame_interval = 1.0 / self.config.get('fps_limit', 30)
+        
+        width, height = frame_size
+        self.staging = np.zeros((height, 0), dtype=np.uint8)
+        self.mosaic = np.empty_like(self.staging)
+        self.slots = {}  # slot -> (motion_threshold, min_area)
+        self.results = [False] * capacity
+        # Số chu kỳ giữ nguyên results sau khi mosaic đổi kích thước (MOG2 đang học lại)
+        self.warmup_periods = self.config.get('motion_pool_warmup', 5)
+        self.warmup = 0
+        self.mutex = QMutex()
+        self.is_running = False
+        
+        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(
+            history=self.config.get('mog2_history', 500), 
+            varThreshold=self.config.get('mog2_var_threshold', 16), 
+            detectShadows=self.config.get('mog2_detect_shadows', True))
+
+    def acquire_slot(self, motion_threshold, min_area):
+        """Cấp một slot trống, None nếu pool đã đầy"""
+        self.mutex.lock()
+        try:
+            for slot in range(self.capacity):
+                if slot not in self.slots:
+                    self.slots[slot] = (motion_threshold, min_area)
+                    self.results[slot] = False
+                    self.resize_staging()
+                    return slot
+            return None
+        finally:
+            self.mutex.unlock()
+
+    def release_slot(self, slot):
+        """Trả slot về pool"""
+        width = self.frame_size[0]
+        self.mutex.lock()
+        self.slots.pop(slot, None)
+        self.results[slot] = False
+        self.resize_staging()
+        if slot * width < self.staging.shape[1]:
+            self.staging[:, slot * width:(slot + 1) * width] = 0
+        self.mutex.unlock()
+
+    def resize_staging(self):
+        """Co/giãn mosaic theo slot cao nhất đang dùng (gọi khi đang giữ mutex).
+
+        MOG2 tự khởi tạo lại background model khi kích thước mosaic đổi.
+        """
+        width, height = self.frame_size
+        columns = (max(self.slots) + 1) * width if self.slots else 0
+        if columns == self.staging.shape[1]:
+            return
+        staging = np.zeros((height, columns), dtype=np.uint8)
+        keep = min(columns, self.staging.shape[1])
+        staging[:, :keep] = self.staging[:, :keep]
+        self.staging = staging
+        self.mosaic = np.empty_like(staging)
+        self.warmup = self.warmup_periods
+
+    def submit(self, slot, gray):
+        """Ghi frame vào slot, trả về kết quả motion gần nhất của slot"""
+        width = self.frame_size[0]
+        self.mutex.lock()
+        np.copyto(self.staging[:, slot * width:(slot + 1) * width], gray)
+        self.mutex.unlock()
+        return self.results[slot]
+
+    def run(self):
+        self.is_running = True
+        width = self.frame_size[0]
+        while self.is_running:
+            start_time = time.monotonic()
+            
+            self.mutex.lock()
+            mosaic = self.mosaic
+            np.copyto(mosaic, self.staging)
+            active = list(self.slots.items())
+            warming_up = self.warmup > 0
+            if warming_up:
+                self.warmup -= 1
+            self.mutex.unlock()
+            
+            if active:
+                fgmask = self.background_subtractor.apply(mosaic)
+                
+            # Model vừa khởi tạo lại coi cả frame là foreground: giữ kết quả cũ tới khi ổn định
+            if active and not warming_up:
+                for slot, (motion_threshold, min_area) in active:
+                    _, thresh = cv2.threshold(fgmask[:, slot * width:(slot + 1) * width], 
+                        motion_threshold, 255, cv2.THRESH_BINARY)
+                    self.results[slot] = has_motion_region(thresh, min_area)
+                    
+            elapsed = time.monotonic() - start_time
+            if elapsed < self.frame_interval:
+                self.msleep(int((self.frame_interval - elapsed) * 1000))
+
+    def stop(self):
+        """Dừng worker"""
+        self.is_running = False
+        self.wait()
+
 class CameraManager:
     def __init__(self):
         self.cameras = {}  # Dictionary lưu trữ các camera threads
         self.config = {}   # Cấu hình chung cho cameras
+        self.motion_pools = {}  # (motion_size, tham số MOG2, fps_limit) -> MotionPool
         
     def add_camera(self, camera_id, camera_url, config=None):
         """Thêm camera mới"""
@@ -215,27 +694,99 @@ class CameraManager:
             camera_config.update(config)
             
         thread = CameraThread(camera_id, camera_url, camera_config)
+        if thread.motion_detection_enabled and camera_config.get('shared_motion_pool', True):
+            self.attach_motion_pool(thread)
         self.cameras[camera_id] = thread
+        
+        # Chia core cho OpenCV theo số camera để tránh oversubscription
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) // len(self.cameras)))
+        # Pin là opt-in: thread OpenCV tạo từ camera thread đã pin sẽ kế thừa mask một CPU
+        if camera_config.get('pin_cpu', False) and hasattr(os, 'sched_getaffinity'):
+            thread.cpu_affinity = self.pick_cpu()
+            
         thread.start()
         
+    def pick_cpu(self):
+        """Chọn CPU có ít camera đã pin nhất (ưu tiên CPU còn trống)"""
+        usage = {cpu: 0 for cpu in sorted(os.sched_getaffinity(0))}
+        for camera in self.cameras.values():
+            if camera.cpu_affinity in usage:
+                usage[camera.cpu_affinity] += 1
+        return min(usage, key=usage.get)
+        
+    def attach_motion_pool(self, thread):
+        """Gắn camera vào MotionPool theo kích thước frame motion và tham số MOG2/fps của camera"""
+        key = (thread.motion_size, thread.mog2_history, thread.mog2_var_threshold,
+               thread.mog2_detect_shadows, thread.fps_limit)
+        pool = self.motion_pools.get(key)
+        if pool is None:
+            pool = MotionPool(thread.motion_size, config=thread.config)
+            self.motion_pools[key] = pool
+            pool.start()
+            
+        # Pool đầy thì camera giữ MOG2 riêng
+        slot = pool.acquire_slot(thread.motion_threshold, thread.scaled_min_motion_area)
+        if slot is not None:
+            thread.motion_pool = pool
+            thread.motion_slot = slot
+        
     def remove_camera(self, camera_id):
         """Xóa camera"""
         if camera_id in self.cameras:
-            self.cameras[camera_id].stop()
+            camera = self.cameras[camera_id]
+            camera.stop()
+            if camera.motion_pool is not None:
+                camera.motion_pool.release_slot(camera.motion_slot)
             del self.cameras[camera_id]
             
     def get_camera(self, camera_id):
         """Lấy camera thread theo ID"""
         return self.cameras.get(camera_id)
         
+    def get_frame(self, camera_id, index):
+        """Lấy frame trong ring buffer của camera"""
+        camera = self.cameras.get(camera_id)
+        if camera is None:
+            return None
+        return camera.frame_ring[index]
+        
+    def attach_view(self, camera_id, view):
+        """Kết nối signals của camera với CameraView"""
+        camera = self.cameras.get(camera_id)
+        if camera is None:
+            return
+            
+        view.set_frame_ring(self.get_display_ring(camera_id))
+        camera.frame_ready.connect(view.on_frame_ready)
+        view.frame_consumed.connect(camera.acknowledge_frame)
+        # Bỏ trạng thái pending cũ, nếu không camera sẽ chờ ack cho frame view chưa từng nhận
+        camera.frame_pending = False
+        camera.coalesce_frames = True
+        
+        camera.motion_detected.connect(
+            lambda _, detected: view.set_motion_detected(detected))
+        camera.status_changed.connect(
+            lambda _, connected: view.set_camera_status(connected))
+        
+    def get_display_ring(self, camera_id):
+        """Lấy ring buffer dùng để hiển thị (display_ring nếu có, ngược lại frame_ring)"""
+        camera = self.cameras.get(camera_id)
+        if camera is None:
+            return None
+        return camera.display_ring if camera.display_ring is not None else camera.frame_ring
+        
     def update_config(self, config):
         """Cập nhật cấu hình cho tất cả cameras"""
         self.config.update(config)
         for camera in self.cameras.values():
-            camera.config.update(config)
+            camera.update_config(config)
             
     def stop_all(self):
         """Dừng tất cả cameras"""
         for camera in self.cameras.values():
             camera.stop()
-        self.cameras.clear()
\ No newline at end of file
+        self.cameras.clear()
+        
+        for pool in self.motion_pools.values():
+            pool.stop()
+        self.motion_pools.clear()
\ No newline at end of file
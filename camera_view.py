@@ -1,11 +1,159 @@
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-import cv2
+
+# OpenGL constants (QOpenGLFunctions không export hằng số)
+GL_TEXTURE_2D = 0x0DE1
+GL_TEXTURE_MIN_FILTER = 0x2801
+GL_TEXTURE_MAG_FILTER = 0x2800
+GL_TEXTURE_WRAP_S = 0x2802
+GL_TEXTURE_WRAP_T = 0x2803
+GL_LINEAR = 0x2601
+GL_CLAMP_TO_EDGE = 0x812F
+GL_UNPACK_ALIGNMENT = 0x0CF5
+GL_RGB = 0x1907
+GL_BGR = 0x80E0
+GL_UNSIGNED_BYTE = 0x1401
+GL_COLOR_BUFFER_BIT = 0x4000
+GL_QUADS = 0x0007
+
+class GLVideoView(QOpenGLWidget):
+    """Hiển thị frame BGR qua OpenGL texture, scale/zoom/pan do GPU thực hiện.
+
+    Context không có OpenGL 2.0 (GLES, ANGLE, core profile) thì vẽ QImage bằng QPainter.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.gl = None
+        self.texture_id = None
+        self.texture_size = None
+        self.frame = None
+        self.frame_dirty = False
+        self.zoom_level = 1.0
+        self.pan = (0, 0)
+
+    def set_frame(self, frame, zoom_level=1.0, pan=(0, 0)):
+        """Đánh dấu texture cần upload lại và yêu cầu repaint"""
+        self.frame = frame
+        self.frame_dirty = True
+        self.zoom_level = zoom_level
+        self.pan = pan
+        self.update()
+
+    def frame_size(self):
+        if self.frame is None:
+            return 0, 0
+        height, width = self.frame.shape[:2]
+        return width, height
+
+    def initializeGL(self):
+        profile = QOpenGLVersionProfile()
+        profile.setVersion(2, 0)
+        self.gl = self.context().versionFunctions(profile)
+        if self.gl is None or not self.gl.initializeOpenGLFunctions():
+            print("OpenGL 2.0 functions unavailable, falling back to QPainter rendering")
+            self.gl = None
+            return
+        
+        self.gl.glClearColor(0.1, 0.1, 0.1, 1.0)
+        self.gl.glEnable(GL_TEXTURE_2D)
+        self.gl.glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        
+        self.texture_id = self.gl.glGenTextures(1)
+        self.gl.glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        self.gl.glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        self.gl.glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        self.gl.glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        self.gl.glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        self.texture_size = None
+
+    def paintGL(self):
+        if self.gl is None:
+            painter = QPainter(self)
+            self.paint_image(painter, self.width(), self.height())
+            painter.end()
+            return
+            
+        gl = self.gl
+        gl.glClear(GL_COLOR_BUFFER_BIT)
+        if self.frame is None:
+            return
+            
+        height, width = self.frame.shape[:2]
+        gl.glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        if self.frame_dirty:
+            if self.texture_size != (width, height):
+                gl.glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, width, height, 0,
+                                GL_BGR, GL_UNSIGNED_BYTE, self.frame)
+                self.texture_size = (width, height)
+            else:
+                gl.glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, width, height,
+                                   GL_BGR, GL_UNSIGNED_BYTE, self.frame)
+            self.frame_dirty = False
+            
+        # Giữ tỉ lệ khung hình (letterbox)
+        ratio = self.devicePixelRatioF()
+        view_w = int(self.width() * ratio)
+        view_h = int(self.height() * ratio)
+        scale = min(view_w / width, view_h / height)
+        draw_w = int(width * scale)
+        draw_h = int(height * scale)
+        gl.glViewport((view_w - draw_w) // 2, (view_h - draw_h) // 2, draw_w, draw_h)
+        
+        # Zoom/pan bằng texture coordinates, không resample trên CPU
+        crop_u = 1.0 / self.zoom_level
+        crop_v = 1.0 / self.zoom_level
+        center_u = 0.5 + self.pan[0] / width
+        center_v = 0.5 + self.pan[1] / height
+        u0 = min(max(center_u - crop_u / 2, 0.0), 1.0 - crop_u)
+        v0 = min(max(center_v - crop_v / 2, 0.0), 1.0 - crop_v)
+        u1 = u0 + crop_u
+        v1 = v0 + crop_v
+        
+        # Dòng đầu của frame là cạnh trên của quad
+        gl.glBegin(GL_QUADS)
+        gl.glTexCoord2f(u0, v1)
+        gl.glVertex2f(-1.0, -1.0)
+        gl.glTexCoord2f(u1, v1)
+        gl.glVertex2f(1.0, -1.0)
+        gl.glTexCoord2f(u1, v0)
+        gl.glVertex2f(1.0, 1.0)
+        gl.glTexCoord2f(u0, v0)
+        gl.glVertex2f(-1.0, 1.0)
+        gl.glEnd()
+
+    def paint_image(self, painter, view_w, view_h):
+        """Fallback không dùng GL: vẽ frame BGR888 với zoom/pan qua source rect"""
+        painter.fillRect(0, 0, view_w, view_h, QColor(26, 26, 26))
+        if self.frame is None:
+            return
+            
+        height, width = self.frame.shape[:2]
+        if hasattr(QImage, 'Format_BGR888'):
+            image = QImage(self.frame.data, width, height, 3 * width, QImage.Format_BGR888)
+        else:
+            image = QImage(self.frame.data, width, height, 3 * width, 
+                           QImage.Format_RGB888).rgbSwapped()
+            
+        # Vùng crop theo zoom/pan, giống texture coordinates của paintGL
+        crop_w = width / self.zoom_level
+        crop_h = height / self.zoom_level
+        x0 = min(max(width / 2 + self.pan[0] - crop_w / 2, 0.0), width - crop_w)
+        y0 = min(max(height / 2 + self.pan[1] - crop_h / 2, 0.0), height - crop_h)
+        
+        # Letterbox; không bật SmoothPixmapTransform (tương đương FastTransformation)
+        scale = min(view_w / crop_w, view_h / crop_h)
+        draw_w = crop_w * scale
+        draw_h = crop_h * scale
+        painter.drawImage(
+            QRectF((view_w - draw_w) / 2, (view_h - draw_h) / 2, draw_w, draw_h),
+            image, QRectF(x0, y0, crop_w, crop_h))
 
 class CameraView(QWidget):
     clicked = pyqtSignal()
     double_clicked = pyqtSignal()
+    frame_consumed = pyqtSignal(str)  # Signal báo đã nhận frame (camera_id)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -16,6 +164,8 @@ class CameraView(QWidget):
         self.zoom_level = 1.0
         self.pan_position = QPoint(0, 0)
         self.last_mouse_pos = None
+        self.frame_ring = None
+        self.pending_frame = None
 
     def init_ui(self):
         self.layout = QVBoxLayout(self)
@@ -38,15 +188,7 @@ class CameraView(QWidget):
         header_layout.addStretch()
 
         # Container cho video feed
-        self.video_container = QLabel()
-        self.video_container.setAlignment(Qt.AlignCenter)
-        self.video_container.setStyleSheet("""
-            QLabel {
-                background-color: #1a1a1a;
-                border: 1px solid #333;
-                border-radius: 4px;
-            }
-        """)
+        self.video_container = GLVideoView()
 
         # Overlay controls
         self.overlay = QWidget(self.video_container)
@@ -89,6 +231,12 @@ class CameraView(QWidget):
         self.hide_timer.setSingleShot(True)
         self.hide_timer.timeout.connect(self.hide_overlay)
 
+        # Timer render frame mới nhất ~30 Hz, bất kể FPS của camera
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(33)
+        self.refresh_timer.timeout.connect(self.render_pending_frame)
+        self.refresh_timer.start()
+
     def create_overlay_controls(self, layout):
         # Snapshot button
         snap_btn = QPushButton(QIcon(":/icons/snapshot.png"), "")
@@ -122,38 +270,38 @@ class CameraView(QWidget):
             """)
             layout.addWidget(btn)
 
+    def set_frame_ring(self, frame_ring):
+        """Gắn ring buffer của CameraThread để đọc frame theo index"""
+        self.frame_ring = frame_ring
+
+    def on_frame_ready(self, index, camera_id):
+        # Slot cho CameraThread.frame_ready, đọc frame trực tiếp từ ring
+        if self.frame_ring is not None:
+            self.update_frame(self.frame_ring[index])
+        self.frame_consumed.emit(camera_id)
+
     def update_frame(self, frame):
+        # Chỉ giữ frame mới nhất, refresh_timer sẽ render
+        if frame is not None:
+            self.pending_frame = frame
+
+    def render_pending_frame(self):
+        frame = self.pending_frame
         if frame is None:
             return
+        self.pending_frame = None
             
-        # Xử lý zoom và pan
-        if self.zoom_level != 1.0:
-            height, width = frame.shape[:2]
-            center_x = width / 2 + self.pan_position.x()
-            center_y = height / 2 + self.pan_position.y()
-            
-            M = cv2.getRotationMatrix2D((center_x, center_y), 0, self.zoom_level)
-            frame = cv2.warpAffine(frame, M, (width, height))
-
-        # Chuyển đổi frame sang QImage
-        height, width, channel = frame.shape
-        bytes_per_line = 3 * width
-        q_img = QImage(frame.data, width, height, bytes_per_line, QImage.Format_RGB888)
-        
-        # Scale image to fit container
-        pixmap = QPixmap.fromImage(q_img)
-        scaled_pixmap = pixmap.scaled(self.video_container.size(), 
-                                    Qt.KeepAspectRatio, 
-                                    Qt.SmoothTransformation)
-        
-        self.video_container.setPixmap(scaled_pixmap)
+        # Upload frame lên GPU, scale/zoom/pan thực hiện trong paintGL
+        self.video_container.set_frame(
+            frame, self.zoom_level, (self.pan_position.x(), self.pan_position.y()))
         
         # Update FPS và thông tin khác
         self.update_info_overlay()
 
     def update_info_overlay(self):
+        width, height = self.video_container.frame_size()
         info_text = f"""
-            Resolution: {self.video_container.pixmap().width()}x{self.video_container.pixmap().height()}
+            Resolution: {width}x{height}
             FPS: {self.current_fps:.1f}
             Zoom: {self.zoom_level:.1f}x
         """
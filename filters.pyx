@@ -0,0 +1,81 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""Fused filter kernels cho CameraThread.process_frame"""
+from cython.parallel import prange
+from libc.stdint cimport uint8_t, int16_t
+from libc.stdlib cimport malloc, free
+
+
+cdef inline int reflect101(int i, int n) noexcept nogil:
+    # Giống BORDER_REFLECT_101 (border mặc định của cv2.filter2D)
+    if n == 1:
+        return 0
+    if i < 0:
+        return -i
+    if i >= n:
+        return 2 * n - i - 2
+    return i
+
+
+cdef inline uint8_t clip_pixel(int16_t value, int16_t beta) noexcept nogil:
+    # saturate(|saturate(value) + beta|), viết dạng ternary để compiler vector hoá
+    value = value if value > 0 else 0
+    value = value if value < 255 else 255
+    value = value + beta
+    value = value if value > 0 else -value
+    return <uint8_t>(value if value < 255 else 255)
+
+
+cdef inline void edge_column(const uint8_t* top, const uint8_t* mid, const uint8_t* bot,
+                             uint8_t* out, int x, int width, int channels,
+                             int beta) noexcept nogil:
+    cdef int xm = reflect101(x - 1, width) * channels
+    cdef int xp = reflect101(x + 1, width) * channels
+    cdef int c, i
+    for c in range(channels):
+        i = x * channels + c
+        out[i] = clip_pixel(
+            10 * mid[i]
+            - top[xm + c] - top[i] - top[xp + c]
+            - mid[xm + c] - mid[i] - mid[xp + c]
+            - bot[xm + c] - bot[i] - bot[xp + c], beta)
+
+
+def sharpen_brighten(const uint8_t[:, :, ::1] src, uint8_t[:, :, ::1] dst, int beta):
+    """Sharpen 3x3 + convertScaleAbs(alpha=1, beta) trong một lần duyệt frame.
+
+    Tương đương cv2.filter2D(kernel [[-1,-1,-1],[-1,9,-1],[-1,-1,-1]]) rồi
+    cv2.convertScaleAbs; src và dst phải khác nhau.
+    """
+    cdef int height = src.shape[0]
+    cdef int width = src.shape[1]
+    cdef int channels = src.shape[2]
+    cdef int row_len = width * channels
+    cdef int y, i, ym, yp
+    cdef const uint8_t* top
+    cdef const uint8_t* mid
+    cdef const uint8_t* bot
+    cdef uint8_t* out
+    cdef int16_t* colsum
+    cdef int16_t beta16 = <int16_t>beta
+
+    for y in prange(height, nogil=True, schedule='static'):
+        ym = reflect101(y - 1, height)
+        yp = reflect101(y + 1, height)
+        top = &src[ym, 0, 0]
+        mid = &src[y, 0, 0]
+        bot = &src[yp, 0, 0]
+        out = &dst[y, 0, 0]
+        
+        # Tổng theo cột của 3 dòng, mỗi pixel phần trong chỉ cần 3 phép cộng
+        colsum = <int16_t*>malloc(row_len * sizeof(int16_t))
+        for i in range(row_len):
+            colsum[i] = top[i] + mid[i] + bot[i]
+        for i in range(channels, row_len - channels):
+            out[i] = clip_pixel(
+                <int16_t>(10 * mid[i]) - colsum[i - channels] - colsum[i] - colsum[i + channels], beta16)
+        free(colsum)
+        
+        # Cột đầu và cột cuối
+        edge_column(top, mid, bot, out, 0, width, channels, beta)
+        if width > 1:
+            edge_column(top, mid, bot, out, width - 1, width, channels, beta)
@@ -1,27 +1,87 @@
-from PyQt5.QtCore import QObject, QThread, pyqtSignal, QMutex, QDateTime
+from PyQt5.QtCore import QObject, QThread, QTimer, pyqtSignal, QMutex, QDateTime
 import cv2
 import numpy as np
 import os
 import json
 from datetime import datetime, timedelta
 import sqlite3
-import queue
+import shutil
+import subprocess
+import threading
 import time
+import multiprocessing
+from multiprocessing import shared_memory
+from functools import lru_cache
+
+try:
+    import xxhash
+except ImportError:  # xxhash là optional, fallback về hash() của Python
+    xxhash = None
+
+DELETE_CHUNK_SIZE = 500  # Số tham số tối đa trong một câu DELETE ... IN
+
+@lru_cache(maxsize=None)
+def sql_placeholders(count):
+    """Chuỗi '?, ?, ...' cho câu lệnh IN, cache theo số lượng"""
+    return ", ".join("?" * count)
 
 class RecordingManager(QObject):
     recording_started = pyqtSignal(str)  # Signal khi bắt đầu recording (camera_id)
     recording_stopped = pyqtSignal(str)  # Signal khi dừng recording (camera_id)
     recording_error = pyqtSignal(str, str)  # Signal khi có lỗi (camera_id, error_message)
     storage_warning = pyqtSignal(float)  # Signal cảnh báo dung lượng lưu trữ (percentage_left)
+    storage_checked = pyqtSignal(bool)  # Signal khi background check xong (cleanup_ran)
 
-    def __init__(self, base_path="recordings"):
+    def __init__(self, base_path="recordings", config=None):
         super().__init__()
         self.base_path = base_path
+        self.config = config or {}
         self.recorders = {}  # Dictionary lưu các recording threads
         self.db_path = os.path.join(base_path, "recordings.db")
         self.mutex = QMutex()
-        self.init_storage()
+        
+        # Ngưỡng dọn dẹp: chạy khi free < min_free_space, xóa tới khi free >= target_free_space (GB)
+        self.min_free_space = self.config.get('min_free_space', 10)
+        self.target_free_space = self.config.get('target_free_space', self.min_free_space * 2)
+        self.max_storage_days = self.config.get('max_storage_days', 30)
+        self.check_interval = self.config.get('check_interval', 15)  # Phút
+        
+        # Một kết nối SQLite dùng chung, truy cập qua db_mutex
+        self.db_conn = None
+        self.db_mutex = QMutex()
+        
+        # SQL của các câu lệnh chạy thường xuyên, cùng một chuỗi nên luôn trúng statement cache của sqlite3
+        self.stmt_update_metadata = '''
+            UPDATE recordings 
+            SET end_time = ?,
+                file_size = ?,
+                duration = ?
+            WHERE camera_id = ? AND file_path = ? AND start_time = ?
+        '''
+        # Gắn event với recording mới nhất của camera
+        self.stmt_insert_event = '''
+            INSERT INTO events (recording_id, event_type, timestamp, description)
+            SELECT r.id, ?, ?, ? FROM recordings r
+            WHERE r.camera_id = ?
+            ORDER BY r.start_time DESC LIMIT 1
+        '''
+        
+        # Event được gom lại và ghi một transaction mỗi giây
+        self.event_queue = []
+        self.event_timer = QTimer(self)
+        self.event_timer.timeout.connect(self.flush_events)
+        self.event_timer.start(1000)
+        
+        # Database phải sẵn sàng trước khi check_storage_space có thể cleanup
         self.init_database()
+        self.init_storage()
+        
+        # Kiểm tra dung lượng định kỳ trên thread riêng, chu kỳ tự điều chỉnh
+        self.check_thread = None
+        self.storage_checked.connect(self.adjust_check_interval)
+        self.cleanup_timer = QTimer(self)
+        self.cleanup_timer.timeout.connect(self.background_check)
+        self.cleanup_timer.start(self.check_interval * 60 * 1000)
 
     def init_storage(self):
         """Khởi tạo thư mục lưu trữ"""
@@ -38,11 +98,27 @@ class RecordingManager(QObject):
         except Exception as e:
             print(f"Storage initialization error: {str(e)}")
 
+    def connect_db(self):
+        """Mở kết nối SQLite với các PRAGMA tối ưu cho ghi liên tục"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-20000")
+        # Bật FK để xóa recording kéo theo events (ON DELETE CASCADE)
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
     def init_database(self):
         """Khởi tạo database để lưu metadata"""
+        self.db_mutex.lock()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            os.makedirs(self.base_path, exist_ok=True)
+            self.db_conn = self.connect_db()
+            # WAL được lưu trong file database, chỉ cần set một lần
+            self.db_conn.execute("PRAGMA journal_mode=WAL")
+            
+            cursor = self.db_conn.cursor()
             
             # Tạo bảng recordings
             cursor.execute('''
@@ -60,22 +136,55 @@ class RecordingManager(QObject):
             ''')
             
             # Tạo bảng events
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS events (
+            events_schema = '''
+                CREATE TABLE IF NOT EXISTS {} (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     recording_id INTEGER,
                     event_type TEXT NOT NULL,
                     timestamp TIMESTAMP NOT NULL,
                     description TEXT,
-                    FOREIGN KEY (recording_id) REFERENCES recordings (id)
+                    FOREIGN KEY (recording_id) REFERENCES recordings (id) ON DELETE CASCADE
                 )
+            '''
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'events'")
+            result = cursor.fetchone()
+            if result and "ON DELETE CASCADE" not in result[0]:
+                # Migrate bảng cũ: bỏ các event mồ côi, copy sang bảng mới có cascade
+                cursor.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor.execute(events_schema.format("events_new"))
+                    cursor.execute('''
+                        INSERT INTO events_new (id, recording_id, event_type, timestamp, description)
+                        SELECT id, recording_id, event_type, timestamp, description FROM events
+                        WHERE recording_id IS NULL OR recording_id IN (SELECT id FROM recordings)
+                    ''')
+                    cursor.execute("DROP TABLE events")
+                    cursor.execute("ALTER TABLE events_new RENAME TO events")
+                    cursor.execute("COMMIT")
+                except Exception:
+                    cursor.execute("ROLLBACK")
+                    raise
+            else:
+                cursor.execute(events_schema.format("events"))
+            
+            # Index cho cleanup (theo start_time) và tra recording mới nhất của camera
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_recordings_start_time 
+                ON recordings (start_time)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_recordings_camera_start 
+                ON recordings (camera_id, start_time DESC)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_events_recording 
+                ON events (recording_id, timestamp)
             ''')
-            
-            conn.commit()
-            conn.close()
             
         except Exception as e:
             print(f"Database initialization error: {str(e)}")
+        finally:
+            self.db_mutex.unlock()
 
     def start_recording(self, camera_id, config=None):
         """Bắt đầu recording cho một camera"""
@@ -85,6 +194,9 @@ class RecordingManager(QObject):
             if camera_id in self.recorders:
                 self.stop_recording(camera_id)
                 
+            # Event đang chờ phải gắn với recording cũ, không phải recording sắp bắt đầu
+            self.flush_events()
+                
             recorder = RecorderThread(camera_id, self.base_path, config)
             recorder.recording_error.connect(
                 lambda err: self.recording_error.emit(camera_id, err))
@@ -116,12 +228,34 @@ class RecordingManager(QObject):
                 
                 self.recording_stopped.emit(camera_id)
                 self.log_event(camera_id, "recording_stop", "Recording stopped")
+                self.flush_events()
                 
         except Exception as e:
             self.recording_error.emit(camera_id, str(e))
         finally:
             self.mutex.unlock()
 
+    def close(self):
+        """Dừng tất cả recording, ghi các event còn chờ và đóng database"""
+        self.cleanup_timer.stop()
+        self.event_timer.stop()
+        
+        for camera_id in list(self.recorders):
+            self.stop_recording(camera_id)
+            
+        if self.check_thread and self.check_thread.is_alive():
+            self.check_thread.join()
+            
+        self.flush_events()
+        
+        self.db_mutex.lock()
+        try:
+            if self.db_conn:
+                self.db_conn.close()
+                self.db_conn = None
+        finally:
+            self.db_mutex.unlock()
+
     def handle_recording_finished(self, camera_id):
         """Xử lý khi recording kết thúc"""
         try:
@@ -168,12 +302,27 @@ class RecordingManager(QObject):
             if free_percent < 10:
                 self.storage_warning.emit(free_percent)
                 
-            # Tự động dọn dẹp nếu cần
-            if free_percent < 5:
-                self.cleanup_old_recordings()
+            # Tự động dọn dẹp nếu cần (cleanup tự bỏ qua khi còn đủ chỗ)
+            return self.cleanup_old_recordings(total, free)
                 
         except Exception as e:
             print(f"Storage check error: {str(e)}")
+            return False
+
+    def background_check(self):
+        """Chạy check_storage_space ngoài UI thread"""
+        if self.check_thread and self.check_thread.is_alive():
+            return
+            
+        self.check_thread = threading.Thread(
+            target=lambda: self.storage_checked.emit(bool(self.check_storage_space())),
+            daemon=True)
+        self.check_thread.start()
+
+    def adjust_check_interval(self, cleanup_ran):
+        """Thiếu chỗ thì kiểm tra mỗi 5 phút, bình thường thì giãn ra 60 phút"""
+        minutes = 5 if cleanup_ran else max(self.check_interval, 60)
+        self.cleanup_timer.setInterval(minutes * 60 * 1000)
 
     def get_storage_info(self):
         """Lấy thông tin về dung lượng lưu trữ"""
@@ -182,115 +331,251 @@ class RecordingManager(QObject):
         total, used, free = shutil.disk_usage(self.base_path)
         return total, used, free
 
-    def cleanup_old_recordings(self):
-        """Dọn dẹp các recording cũ"""
-        try:
-            # Lấy danh sách recording cũ hơn 30 ngày
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            thirty_days_ago = datetime.now() - timedelta(days=30)
+    def cleanup_old_recordings(self, total=None, free=None):
+        """Dọn dẹp recording cũ khi dung lượng trống dưới ngưỡng, trả về True nếu đã dọn"""
+        if total is None:
+            total, used, free = self.get_storage_info()
             
-            cursor.execute('''
-                SELECT file_path FROM recordings 
-                WHERE start_time < ? 
+        # Còn đủ chỗ: không mở transaction, không quét thư mục
+        low_watermark = max(self.min_free_space * 1024**3, total * 0.05)
+        if free >= low_watermark:
+            return False
+        high_watermark = max(self.target_free_space * 1024**3, total * 0.10)
+        
+        # Recording quá hạn luôn bị xóa, sau đó xóa tiếp recording cũ nhất tới high watermark
+        cutoff = datetime.now() - timedelta(days=self.max_storage_days)
+        cutoff_key = str(cutoff)  # Cùng định dạng với datetime adapter của sqlite3
+        
+        # Đọc danh sách recording trong một lần giữ lock ngắn
+        self.db_mutex.lock()
+        try:
+            recordings = self.db_conn.execute('''
+                SELECT file_path, start_time FROM recordings 
                 ORDER BY start_time ASC
-            ''', (thirty_days_ago,))
-            
-            old_recordings = cursor.fetchall()
+            ''').fetchall()
+        except Exception as e:
+            print(f"Cleanup error: {str(e)}")
+            return False
+        finally:
+            self.db_mutex.unlock()
             
-            # Xóa các file
-            for (file_path,) in old_recordings:
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    
-                    # Xóa record trong database
+        # Xóa file ngoài db_mutex để flush_events (UI thread) không bị chặn.
+        # File đã mất từ trước coi như đã xóa.
+        # Snapshot recorders: start/stop_recording sửa dict trên thread khác
+        self.mutex.lock()
+        try:
+            recorders = list(self.recorders.values())
+        finally:
+            self.mutex.unlock()
+        active = {recorder.file_path for recorder in recorders}
+        removed = []
+        partial = False  # Có record phải giữ lại
+        last_start = None  # start_time của record cuối cùng đã xử lý
+        for file_path, start_time in recordings:
+            if start_time >= cutoff_key and free >= high_watermark:
+                break
+            last_start = start_time
+            if file_path in active:
+                partial = True
+                continue
+            try:
+                size = os.stat(file_path).st_size
+                os.remove(file_path)
+                free += size
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Cleanup error: {file_path}: {str(e)}")
+                partial = True
+                continue
+            removed.append(file_path)
+            
+        # Xóa record trong database bằng một transaction ngắn
+        cleaned = False
+        self.db_mutex.lock()
+        try:
+            conn = self.db_conn
+            # Dữ liệu bị xóa vốn không cần giữ, bỏ fsync trong lúc dọn dẹp (vẫn giữ WAL)
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.cursor()
+                if not partial and last_start is not None:
+                    # Giới hạn theo start_time để không đụng record thêm vào sau lúc SELECT
                     cursor.execute('''
-                        DELETE FROM recordings WHERE file_path = ?
-                    ''', (file_path,))
-            
-            conn.commit()
-            conn.close()
+                        DELETE FROM recordings WHERE start_time <= ?
+                    ''', (last_start,))
+                elif partial:
+                    # Giữ lại record của các file chưa xóa được hoặc đang ghi
+                    for i in range(0, len(removed), DELETE_CHUNK_SIZE):
+                        chunk = removed[i:i + DELETE_CHUNK_SIZE]
+                        cursor.execute(
+                            f"DELETE FROM recordings WHERE file_path IN ({sql_placeholders(len(chunk))})",
+                            chunk)
+                
+                conn.execute("COMMIT")
+                cleaned = True
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("PRAGMA synchronous=NORMAL")
+                
+            # Cập nhật thống kê cho query planner sau khi xóa nhiều
+            conn.execute("ANALYZE")
             
         except Exception as e:
             print(f"Cleanup error: {str(e)}")
+        finally:
+            self.db_mutex.unlock()
+            
+        # Xóa file mồ côi (crash, không có record) bằng một lần duyệt thư mục
+        self.sweep_old_files(self.base_path, cutoff.timestamp())
+        return cleaned
+
+    def sweep_old_files(self, path, cutoff):
+        """Duyệt đệ quy bằng os.scandir, xóa file .mp4 có mtime cũ hơn cutoff"""
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            self.sweep_old_files(entry.path, cutoff)
+                        elif (entry.name.endswith(".mp4") and
+                              entry.stat(follow_symlinks=False).st_mtime < cutoff):
+                            os.unlink(entry.path)
+                    except OSError as e:
+                        print(f"Cleanup error: {entry.path}: {str(e)}")
+                        
+        except OSError as e:
+            print(f"Cleanup error: {path}: {str(e)}")
 
     def update_recording_metadata(self, camera_id, start_time, end_time, 
                                 file_path, file_size, duration):
         """Cập nhật metadata cho recording"""
+        self.db_mutex.lock()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE recordings 
-                SET end_time = ?,
-                    file_size = ?,
-                    duration = ?
-                WHERE camera_id = ? AND file_path = ? AND start_time = ?
-            ''', (end_time, file_size, duration, camera_id, file_path, start_time))
-            
-            conn.commit()
-            conn.close()
+            self.db_conn.execute(
+                self.stmt_update_metadata,
+                (end_time, file_size, duration, camera_id, file_path, start_time))
             
         except Exception as e:
             print(f"Metadata update error: {str(e)}")
+        finally:
+            self.db_mutex.unlock()
 
     def log_event(self, camera_id, event_type, description):
-        """Ghi log event"""
+        """Đưa event vào hàng đợi, flush_events sẽ ghi xuống database"""
+        # Lưu monotonic, flush_events đổi sang wall time bằng một lần datetime.now()
+        self.event_queue.append((event_type, time.monotonic(), description, camera_id))
+
+    def flush_events(self):
+        """Ghi toàn bộ event đang chờ trong một transaction"""
+        if not self.event_queue:
+            return
+            
+        events, self.event_queue = self.event_queue, []
+        now_wall, now_mono = datetime.now(), time.monotonic()
+        events = [
+            (event_type, now_wall - timedelta(seconds=now_mono - stamp), description, camera_id)
+            for event_type, stamp, description, camera_id in events
+        ]
+        
+        self.db_mutex.lock()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Lấy recording_id hiện tại
-            cursor.execute('''
-                SELECT id FROM recordings 
-                WHERE camera_id = ? 
-                ORDER BY start_time DESC LIMIT 1
-            ''', (camera_id,))
-            
-            result = cursor.fetchone()
-            if result:
-                recording_id = result[0]
-                
-                # Thêm event
-                cursor.execute('''
-                    INSERT INTO events (recording_id, event_type, timestamp, description)
-                    VALUES (?, ?, ?, ?)
-                ''', (recording_id, event_type, datetime.now(), description))
-                
-                conn.commit()
-                
-            conn.close()
+            cursor = self.db_conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.executemany(self.stmt_insert_event, events)
+            cursor.execute("COMMIT")
             
         except Exception as e:
+            if self.db_conn.in_transaction:
+                self.db_conn.execute("ROLLBACK")
             print(f"Event logging error: {str(e)}")
+        finally:
+            self.db_mutex.unlock()
 
-class RecorderThread(QThread):
-    recording_error = pyqtSignal(str)  # Signal báo lỗi
+class FFmpegWriter:
+    """Encode video qua FFmpeg subprocess (encoder phần cứng), interface giống cv2.VideoWriter"""
+
+    def __init__(self, file_path, fps, resolution, encoder='h264_nvenc', bitrate='4M',
+                 segment_duration=None, segment_list=None, hw_device='/dev/dri/renderD128'):
+        width, height = resolution
+        cmd = ['ffmpeg', '-loglevel', 'error', '-y']
+        if encoder.endswith('_vaapi'):
+            cmd += ['-vaapi_device', hw_device]
+        cmd += [
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-',
+        ]
+        # Input bgr24: nvenc tự chuyển format, qsv cần nv12, vaapi cần nv12 đã upload lên GPU
+        if encoder.endswith('_vaapi'):
+            cmd += ['-vf', 'format=nv12,hwupload']
+        elif encoder.endswith('_qsv'):
+            cmd += ['-pix_fmt', 'nv12']
+        cmd += ['-c:v', encoder, '-b:v', bitrate]
+        if encoder.endswith('_nvenc'):
+            cmd += ['-preset', 'p4']
+        if segment_duration:
+            # Segment muxer tự cắt file (file_path chứa %04d), keyframe đúng ranh giới segment
+            cmd += [
+                '-force_key_frames', f'expr:gte(t,n_forced*{segment_duration})',
+                '-f', 'segment', '-segment_time', str(segment_duration),
+                '-segment_format', 'mp4', '-reset_timestamps', '1',
+                '-segment_list', segment_list, '-segment_list_type', 'flat',
+                file_path,
+            ]
+        else:
+            cmd += ['-f', 'mp4', file_path]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, bufsize=0)
+        self.fd = self.proc.stdin.fileno()
+
+    def isOpened(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def write(self, frame):
+        # Ghi thẳng buffer của frame (C-contiguous), không qua tobytes()
+        view = memoryview(frame).cast('B')
+        while view:
+            if hasattr(os, 'writev'):
+                written = os.writev(self.fd, [view])  # Một syscall, không qua file object
+            else:
+                written = self.proc.stdin.write(view)
+            view = view[written:]
+
+    def release(self):
+        if self.proc is not None:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+class RecorderProcess:
+    """Encode recording trong process riêng, đọc frame từ ring trong shared memory"""
 
     def __init__(self, camera_id, base_path, config=None):
-        super().__init__()
         self.camera_id = camera_id
         self.base_path = base_path
         self.config = config or {}
         
-        # Recording status
-        self.is_recording = False
-        self.frame_buffer = queue.Queue(maxsize=300)  # Buffer 10 seconds at 30fps
-        
         # Recording info
         self.start_time = None
+        self.start_monotonic = None  # Mốc monotonic ứng với start_time
         self.end_time = None
         self.file_path = None
         self.file_size = 0
+        self.bytes_written = 0  # Tổng kích thước các segment đã đóng
         self.duration = 0
+        self.segment_index = 0  # Tăng mỗi segment, tránh trùng tên file trong cùng một giây
+        self.start_stamp = None
         
         # Video writer
         self.writer = None
+        self.conn = None  # Pipe báo trạng thái về RecorderThread
         
         # Initialize settings
         self.init_settings()
+        self.buffer_frames = self.config.get('buffer_frames', 60)  # 2 giây ở 30fps
 
     def init_settings(self):
         """Khởi tạo các thiết lập recording"""
@@ -299,6 +584,13 @@ class RecorderThread(QThread):
         self.codec = self.config.get('codec', 'H264')
         self.segment_duration = self.config.get('segment_duration', 300)  # 5 minutes
         
+        # Hardware encode qua FFmpeg (h264_nvenc / h264_qsv / h264_vaapi)
+        self.hardware_acceleration = (self.config.get('hardware_acceleration', False) 
+                                      and shutil.which('ffmpeg') is not None)
+        self.hardware_encoder = self.config.get('hardware_encoder', 'h264_nvenc')
+        self.hardware_device = self.config.get('hardware_device', '/dev/dri/renderD128')  # Chỉ dùng cho VAAPI
+        self.bitrate = self.config.get('bitrate', '4M')
+        
         # Codec settings
         if self.codec == 'H264':
             self.fourcc = cv2.VideoWriter_fourcc(*'X264')
@@ -307,56 +599,81 @@ class RecorderThread(QThread):
         else:
             self.fourcc = cv2.VideoWriter_fourcc(*'XVID')
 
-    def run(self):
-        """Main recording loop"""
+    def run(self, shm_name, head, tail, running, consumer_waiting, frame_condition, conn):
+        """Main recording loop (chạy trong child process)"""
+        # Mỗi process một encoder, tránh OpenCV tự mở thêm thread pool
+        cv2.setNumThreads(1)
+        shm = shared_memory.SharedMemory(name=shm_name)
+        frame_ring = np.ndarray(
+            (self.buffer_frames, self.resolution[1], self.resolution[0], 3), 
+            dtype=np.uint8, buffer=shm.buf)
+        self.conn = conn
         try:
-            self.is_recording = True
             self.start_time = datetime.now()
+            self.start_monotonic = time.monotonic()
+            self.start_stamp = self.start_time.strftime('%Y%m%d_%H%M%S')
             
             # Tạo file path
             self.file_path = self.create_file_path()
+            self.conn.send(('started', (self.start_time, self.file_path)))
             
             # Khởi tạo video writer
-            self.writer = cv2.VideoWriter(
-                self.file_path, 
-                self.fourcc, 
-                self.fps, 
-                self.resolution
-            )
+            self.writer = self.create_writer()
             
-            segment_start_time = time.time()
+            # FFmpeg tự cắt segment, chỉ cv2.VideoWriter cần mở lại writer
+            if self.hardware_acceleration:
+                segment_deadline = float('inf')
+            else:
+                segment_deadline = time.monotonic() + self.segment_duration
             frames_written = 0
             
-            while self.is_recording:
-                if not self.frame_buffer.empty():
-                    frame = self.frame_buffer.get()
+            while running.value:
+                if head.value == tail.value:
+                    # Ring rỗng: ngủ tới khi add_frame notify, sau đó ghi liên tục tới khi rỗng
+                    with frame_condition:
+                        consumer_waiting.value = 1
+                        if head.value == tail.value and running.value:
+                            frame_condition.wait(0.25)
+                        consumer_waiting.value = 0
+                    continue
                     
-                    if frame is not None:
-                        self.writer.write(frame)
-                        frames_written += 1
-                        
-                        # Check if need to start new segment
-                        if time.time() - segment_start_time >= self.segment_duration:
-                            self.start_new_segment()
-                            segment_start_time = time.time()
-                            
-                else:
-                    # Avoid busy waiting
-                    time.sleep(0.001)
+                self.writer.write(frame_ring[head.value % self.buffer_frames])
+                head.value += 1
+                frames_written += 1
+                
+                # Check if need to start new segment
+                if time.monotonic() >= segment_deadline:
+                    self.start_new_segment()
+                    segment_deadline = time.monotonic() + self.segment_duration
                     
             # Cleanup
             self.end_recording(frames_written)
+            self.conn.send(('finished', {
+                'start_time': self.start_time,
+                'end_time': self.end_time,
+                'file_path': self.file_path,
+                'file_size': self.file_size,
+                'duration': self.duration,
+            }))
             
         except Exception as e:
-            self.recording_error.emit(str(e))
+            self.conn.send(('error', str(e)))
             self.cleanup()
+        finally:
+            del frame_ring
+            shm.close()
+            self.conn.close()
 
     def create_file_path(self):
-        """Tạo đường dẫn file recording"""
-        now = datetime.now()
-        filename = f"{self.camera_id}_{now.strftime('%Y%m%d_%H%M%S')}.mp4"
+        """Tạo đường dẫn file recording (pattern %04d khi FFmpeg tự cắt segment)"""
+        index = "%04d" if self.hardware_acceleration else f"{self.segment_index:04d}"
+        filename = f"{self.camera_id}_{self.start_stamp}_{index}.mp4"
         return os.path.join(self.base_path, filename)
 
+    def segment_list_path(self):
+        """File danh sách segment FFmpeg đã đóng"""
+        return os.path.join(self.base_path, f"{self.camera_id}_{self.start_stamp}.segments")
+
     def start_new_segment(self):
         """Bắt đầu segment recording mới"""
         # Close current writer
@@ -367,39 +684,199 @@ class RecorderThread(QThread):
         self.update_file_size()
             
         # Create new file path
+        self.segment_index += 1
         self.file_path = self.create_file_path()
+        self.conn.send(('segment', self.file_path))
         
         # Create new writer
-        self.writer = cv2.VideoWriter(
+        self.writer = self.create_writer()
+
+    def create_writer(self):
+        """Tạo video writer cho file_path hiện tại"""
+        if self.hardware_acceleration:
+            return FFmpegWriter(
+                self.file_path, 
+                self.fps, 
+                self.resolution, 
+                self.hardware_encoder, 
+                self.bitrate,
+                self.segment_duration,
+                self.segment_list_path(),
+                self.hardware_device
+            )
+            
+        return cv2.VideoWriter(
             self.file_path, 
             self.fourcc, 
             self.fps, 
             self.resolution
         )
 
-    def add_frame(self, frame):
-        """Thêm frame vào buffer"""
-        if not self.frame_buffer.full():
-            self.frame_buffer.put(frame)
-
-    def stop(self):
-        """Dừng recording"""
-        self.is_recording = False
-
     def end_recording(self, frames_written):
         """Kết thúc recording và cập nhật thông tin"""
-        self.end_time = datetime.now()
-        self.duration = (self.end_time - self.start_time).total_seconds()
-        self.update_file_size()
+        self.duration = time.monotonic() - self.start_monotonic
+        self.end_time = self.start_time + timedelta(seconds=self.duration)
+        # Đóng writer trước để file đã finalize khi stat
         self.cleanup()
+        self.update_file_size()
 
     def update_file_size(self):
-        """Cập nhật kích thước file"""
-        if self.file_path and os.path.exists(self.file_path):
-            self.file_size = os.path.getsize(self.file_path)
+        """Cộng kích thước segment vừa đóng vào bytes_written"""
+        if self.hardware_acceleration:
+            self.collect_segments()
+        elif self.file_path:
+            try:
+                self.bytes_written += os.stat(self.file_path).st_size
+            except OSError:
+                pass
+        self.file_size = self.bytes_written
+
+    def collect_segments(self):
+        """Đọc danh sách segment FFmpeg đã ghi, cập nhật file_path và bytes_written"""
+        list_path = self.segment_list_path()
+        try:
+            with open(list_path) as f:
+                names = [line.strip() for line in f if line.strip()]
+            os.remove(list_path)
+        except OSError:
+            return
+            
+        for name in names:
+            self.file_path = os.path.join(self.base_path, os.path.basename(name))
+            try:
+                self.bytes_written += os.stat(self.file_path).st_size
+            except OSError:
+                pass
+        self.segment_index = max(len(names) - 1, 0)
 
     def cleanup(self):
         """Dọn dẹp resources"""
         if self.writer:
             self.writer.release()
-            self.writer = None
\ No newline at end of file
+            self.writer = None
+class RecorderThread(QThread):
+    """Giữ ring frame trong shared memory, điều khiển RecorderProcess và báo kết quả qua signal"""
+    recording_error = pyqtSignal(str)  # Signal báo lỗi
+
+    def __init__(self, camera_id, base_path, config=None):
+        super().__init__()
+        self.camera_id = camera_id
+        self.recorder = RecorderProcess(camera_id, base_path, config)
+        self.process = None
+        
+        # Recording status
+        self.is_recording = False
+        
+        # Recording info (cập nhật từ child process)
+        self.start_time = None
+        self.end_time = None
+        self.file_path = None
+        self.file_size = 0
+        self.duration = 0
+        
+        # Frame buffer: ring cấp phát sẵn trong shared memory, một producer (add_frame)
+        # một consumer (child process). head/tail chỉ tăng, mỗi bên chỉ ghi biến của mình.
+        self.mp_context = multiprocessing.get_context('spawn')
+        self.buffer_frames = self.recorder.buffer_frames
+        width, height = self.recorder.resolution
+        shape = (self.buffer_frames, height, width, 3)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        self.frame_ring = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.head = self.mp_context.RawValue('q', 0)  # Frame tiếp theo cần ghi
+        self.tail = self.mp_context.RawValue('q', 0)  # Slot tiếp theo để add_frame copy vào
+        self.running = self.mp_context.RawValue('b', 1)
+        self.consumer_waiting = self.mp_context.RawValue('b', 0)
+        self.frame_condition = self.mp_context.Condition()  # Đánh thức child khi có frame mới
+        
+        # Bỏ frame gần như trùng frame trước (camera tĩnh), so sánh hash của ảnh 32x32.
+        # Tắt mặc định: writer fps cố định nên bỏ frame làm video ngắn lại.
+        self.skip_duplicate_frames = self.recorder.config.get('skip_duplicate_frames', False)
+        self.thumbnail = np.empty((32, 32, 3), dtype=np.uint8)
+        self.last_digest = None
+        self.duplicate_frames = 0
+
+    def run(self):
+        """Chạy RecorderProcess và nhận trạng thái cho tới khi process kết thúc"""
+        try:
+            self.is_recording = True
+            recv_conn, send_conn = self.mp_context.Pipe(duplex=False)
+            self.process = self.mp_context.Process(
+                target=self.recorder.run,
+                args=(self.shm.name, self.head, self.tail, self.running,
+                      self.consumer_waiting, self.frame_condition, send_conn),
+                daemon=True)
+            self.process.start()
+            send_conn.close()
+            
+            while True:
+                try:
+                    message, value = recv_conn.recv()
+                except EOFError:
+                    break
+                    
+                if message == 'started':
+                    self.start_time, self.file_path = value
+                elif message == 'segment':
+                    self.file_path = value
+                elif message == 'finished':
+                    for key, item in value.items():
+                        setattr(self, key, item)
+                elif message == 'error':
+                    self.recording_error.emit(value)
+                    
+            self.process.join()
+            
+        except Exception as e:
+            self.recording_error.emit(str(e))
+        finally:
+            self.is_recording = False
+            self.release_buffer()
+
+    def add_frame(self, frame):
+        """Copy frame vào ring buffer, bỏ frame nếu buffer đầy"""
+        ring = self.frame_ring
+        tail = self.tail.value
+        if frame is None or ring is None or tail - self.head.value >= self.buffer_frames:
+            return
+            
+        if self.skip_duplicate_frames:
+            # Bỏ 3 bit thấp để nhiễu sensor không làm đổi hash
+            cv2.resize(frame, (32, 32), dst=self.thumbnail, interpolation=cv2.INTER_AREA)
+            np.right_shift(self.thumbnail, 3, out=self.thumbnail)
+            data = self.thumbnail.tobytes()
+            digest = xxhash.xxh3_64_intdigest(data) if xxhash else hash(data)
+            if digest == self.last_digest:
+                self.duplicate_frames += 1
+                return
+            self.last_digest = digest
+            
+        slot = ring[tail % self.buffer_frames]
+        if frame.shape == slot.shape:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, tuple(self.recorder.resolution), dst=slot)
+        self.tail.value = tail + 1
+        
+        # Chỉ lấy lock khi child đang chờ (consumer_waiting set trước khi check lại tail)
+        if self.consumer_waiting.value:
+            with self.frame_condition:
+                self.frame_condition.notify()
+
+    def stop(self):
+        """Dừng recording"""
+        self.is_recording = False
+        self.running.value = 0
+        with self.frame_condition:
+            self.frame_condition.notify()
+
+    def release_buffer(self):
+        """Giải phóng shared memory sau khi child process kết thúc"""
+        self.frame_ring = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # add_frame vẫn đang giữ view, mapping sẽ được giải phóng khi GC
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
@@ -12,6 +12,7 @@ class Settings(QObject):
     def __init__(self, organization="MyOrg", application="SecuritySystem"):
         super().__init__()
         self.settings = QSettings(organization, application)
+        self.cache = {}  # "group/key" -> value, tránh đọc lại QSettings backend mỗi lần get
         self.default_settings = {
             # Camera settings
             "cameras": {},
@@ -24,6 +25,7 @@ class Settings(QObject):
                 "segment_duration": 300,  # 5 minutes
                 "max_storage_days": 30,
                 "min_free_space": 10,  # GB
+                "check_interval": 15,  # minutes
                 "storage_path": "recordings",
                 "backup_path": "backups"
             },
@@ -108,6 +110,7 @@ class Settings(QObject):
                     if not self.settings.contains(group):
                         self.settings.setValue(group, values)
             
+            self.rebuild_cache()
             self.settings_loaded.emit()
             self.logger.info("Settings loaded successfully")
             
@@ -116,6 +119,10 @@ class Settings(QObject):
             # Sử dụng default settings nếu load thất bại
             self.reset_to_defaults()
 
+    def rebuild_cache(self):
+        """Đọc toàn bộ QSettings vào cache một lần"""
+        self.cache = {key: self.settings.value(key) for key in self.settings.allKeys()}
+
     def save_settings(self):
         """Lưu settings hiện tại"""
         try:
@@ -129,7 +136,9 @@ class Settings(QObject):
     def get_value(self, key: str, default=None) -> Any:
         """Lấy giá trị setting theo key"""
         try:
-            value = self.settings.value(key, default)
+            if key not in self.cache:
+                self.cache[key] = self.settings.value(key)
+            value = self.cache[key]
             return value if value is not None else default
         
         except Exception as e:
@@ -139,6 +148,7 @@ class Settings(QObject):
     def set_value(self, key: str, value: Any):
         """Set giá trị cho setting"""
         try:
+            self.cache[key] = value
             self.settings.setValue(key, value)
             self.settings_changed.emit(key, value)
             self.logger.debug(f"Setting updated - {key}: {value}")
@@ -161,6 +171,7 @@ class Settings(QObject):
                 else:
                     self.settings.setValue(group, values)
                     
+            self.rebuild_cache()
             self.settings_loaded.emit()
             self.logger.info("Settings reset to defaults")
             
@@ -216,6 +227,7 @@ class Settings(QObject):
                 else:
                     self.settings.setValue(group, values)
                     
+            self.rebuild_cache()
             self.settings_loaded.emit()
             self.logger.info(f"Settings imported from {filepath}")
             
@@ -227,37 +239,40 @@ class Settings(QObject):
     def get_camera_settings(self, camera_id: str) -> Dict:
         """Lấy settings cho một camera cụ thể"""
         try:
-            self.settings.beginGroup("cameras")
-            camera_settings = self.settings.value(camera_id, {})
-            self.settings.endGroup()
-            
-            # Merge với default settings
-            default_camera = {
-                "name": f"Camera {camera_id}",
-                "url": "",
-                "enabled": True,
-                "resolution": self.get_value("default_resolution"),
-                "fps": self.get_value("default_fps"),
-                "codec": self.get_value("default_codec"),
-                "motion_detection": True,
-                "recording": True
-            }
-            
-            if isinstance(camera_settings, dict):
-                default_camera.update(camera_settings)
-                
-            return default_camera
+            return self.merge_camera_settings(camera_id, self.default_camera_settings())
         
         except Exception as e:
             self.logger.error(f"Error getting camera settings: {str(e)}")
             return {}
 
+    def default_camera_settings(self) -> Dict:
+        """Template settings mặc định cho camera (name được điền theo camera_id)"""
+        return {
+            "name": "",
+            "url": "",
+            "enabled": True,
+            "resolution": self.get_value("default_resolution"),
+            "fps": self.get_value("default_fps"),
+            "codec": self.get_value("default_codec"),
+            "motion_detection": True,
+            "recording": True
+        }
+
+    def merge_camera_settings(self, camera_id: str, default_camera: Dict) -> Dict:
+        """Merge settings đã lưu của camera lên bản copy của template"""
+        camera = dict(default_camera, name=f"Camera {camera_id}")
+        camera_settings = self.get_value(f"cameras/{camera_id}", {})
+        if isinstance(camera_settings, dict):
+            camera.update(camera_settings)
+        return camera
+
     def set_camera_settings(self, camera_id: str, settings: Dict):
         """Set settings cho một camera"""
         try:
             self.settings.beginGroup("cameras")
             self.settings.setValue(camera_id, settings)
             self.settings.endGroup()
+            self.cache[f"cameras/{camera_id}"] = settings
             
             self.settings_changed.emit(f"cameras/{camera_id}", settings)
             self.logger.debug(f"Camera settings updated - {camera_id}")
@@ -271,6 +286,7 @@ class Settings(QObject):
             self.settings.beginGroup("cameras")
             self.settings.remove(camera_id)
             self.settings.endGroup()
+            self.cache.pop(f"cameras/{camera_id}", None)
             
             self.settings_changed.emit(f"cameras/{camera_id}", None)
             self.logger.debug(f"Camera settings removed - {camera_id}")
@@ -282,12 +298,15 @@ class Settings(QObject):
         """Lấy settings của tất cả cameras"""
         try:
             self.settings.beginGroup("cameras")
-            cameras = {
-                key: self.get_camera_settings(key) 
-                for key in self.settings.childKeys()
-            }
+            camera_ids = self.settings.childKeys()
             self.settings.endGroup()
-            return cameras
+            
+            # Đọc default một lần cho tất cả cameras
+            default_camera = self.default_camera_settings()
+            return {
+                camera_id: self.merge_camera_settings(camera_id, default_camera)
+                for camera_id in camera_ids
+            }
         
         except Exception as e:
             self.logger.error(f"Error getting all cameras: {str(e)}")